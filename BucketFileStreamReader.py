@@ -1,30 +1,50 @@
-import io
 import traceback
 
-from google.cloud import storage
+from google.api_core.exceptions import NotFound
+
+from StorageClient import get_client
 
 
 class BucketFileStreamReader:
 
-    def __init__(self,bucket_name):
+    def __init__(self,bucket_name,client=None):
 
         self._bucket_name = bucket_name
 
-    def read(self,filename):
+        # shared client connection
+        self._client = client if client is not None else get_client()
+        # handle to the bucket (built locally, no request is made)
+        self._bucket = self._client.bucket(self._bucket_name)
 
-        # get client connection
-        client = storage.Client()
+    def read(self,filename,generation=None):
 
         try:
-            # get handle to the bucket
-            bucket = client.get_bucket(self._bucket_name)
-            # get the blob from the bucket
-            blob = bucket.get_blob(filename)
+            # get the blob from the bucket (built locally, the content request below is the only round trip), pinned to
+            # the given generation, if any, so the content matches metadata read earlier
+            blob = self._bucket.blob(filename, generation=generation)
 
-            # Return the file as a stream to the caller
-            return io.BytesIO(blob.download_as_string())
+            # Return the file as a stream to the caller. The content is downloaded in chunks as the caller reads it
+            # rather than being held in memory in full.
+            return blob.open("rb")
 
         except:
             print(traceback.format_exc())
             raise
 
+    def signature(self,filename):
+        """
+        Returns the (generation, md5_hash) pair of the blob. Only the blob metadata is fetched, not its content, so this
+        is a cheap way for callers to tell whether a file has changed since they last read it.
+        """
+
+        try:
+            # get the blob metadata from the bucket
+            blob = self._bucket.get_blob(filename)
+            if blob is None:
+                raise NotFound('{0} not found in bucket {1}'.format(filename, self._bucket_name))
+
+            return blob.generation, blob.md5_hash
+
+        except:
+            print(traceback.format_exc())
+            raise
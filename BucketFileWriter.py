@@ -1,28 +1,104 @@
-import io
 import traceback
+import uuid
 
-from google.cloud import storage
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from StorageClient import get_client
 
 
 class BucketFileWriter:
 
-    def __init__(self,bucket_name):
+    # GCS refuses to compose an object made of more than 1024 components
+    max_component_count = 1024
+
+    def __init__(self,bucket_name,client=None):
 
         self._bucket_name = bucket_name
 
-    def upload(self,filename):
+        # shared client connection
+        self._client = client if client is not None else get_client()
+        # handle to the bucket (built locally, no request is made)
+        self._bucket = self._client.bucket(self._bucket_name)
+        # blob handles by filename, reused across uploads of the same file
+        self._blob_cache = {}
+
+    def upload_stream(self,blob_filename,stream,content_type=None):
+        """
+        Uploads the content of a binary stream, from its current position, to the blob without going through a local
+        file.
+        """
+
+        try:
+            # get the blob from the bucket
+            blob = self._blob(blob_filename)
+            blob.upload_from_file(stream, content_type=content_type, if_generation_match=blob.generation)
+
+        except PreconditionFailed:
+            self._evict(blob_filename)
+            print(traceback.format_exc())
+            raise
+
+        except:
+            print(traceback.format_exc())
+            raise
 
-        # get client connection
-        client = storage.Client()
+    def append(self,blob_filename,data):
+        """
+        Appends data to the end of the blob. The data is uploaded as a temporary part which is composed onto the blob
+        server side, so the existing content is never uploaded again.
+        """
 
         try:
-            # get handle to the bucket
-            bucket = client.get_bucket(self._bucket_name)
             # get the blob from the bucket
-            blob = bucket.blob(filename)
-            blob.upload_from_filename(filename=filename)
+            blob = self._blob(blob_filename)
+
+            if blob.generation is None:
+                try:
+                    blob.reload()
+                except NotFound:
+                    blob.upload_from_string(data, content_type='text/plain', if_generation_match=0)
+                    return
+
+            if (blob.component_count or 1) >= self.max_component_count - 1:
+                # rewrite the blob as a single component before it can no longer be composed onto
+                content = blob.download_as_bytes() + (data.encode() if isinstance(data, str) else data)
+                blob.upload_from_string(content, content_type='text/plain', if_generation_match=blob.generation)
+                return
+
+            # a unique part name, so two writers appending to the same blob do not overwrite each other's part
+            part = self._bucket.blob('{0}.{1}.part'.format(blob_filename, uuid.uuid4().hex))
+            part.upload_from_string(data, content_type='text/plain')
+            try:
+                blob.compose([blob, part])
+            finally:
+                self._delete_part(part)
+
+        except (NotFound, PreconditionFailed):
+            # compose names the cached generation as its source, so a blob deleted or rewritten by someone else comes
+            # back as NotFound as well as PreconditionFailed
+            self._evict(blob_filename)
+            print(traceback.format_exc())
+            raise
 
         except:
             print(traceback.format_exc())
             raise
 
+    def _delete_part(self,part):
+        # best effort: the data is either appended already or will be retried, so a leftover part must not fail the
+        # append and make the caller upload it again
+        try:
+            part.delete()
+        except:
+            print(traceback.format_exc())
+
+    def _blob(self,filename):
+        blob = self._blob_cache.get(filename)
+        if blob is None:
+            blob = self._blob_cache[filename] = self._bucket.blob(filename)
+        return blob
+
+    def _evict(self,filename):
+        # the blob was written by someone else since our last upload. Dropping the handle with its stale generation
+        # reports the conflict once; the next upload starts from a fresh handle instead of failing forever.
+        self._blob_cache.pop(filename, None)
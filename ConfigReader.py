@@ -1,6 +1,12 @@
 import traceback, yaml
 from BucketFileStreamReader import BucketFileStreamReader
 
+try:
+    # libyaml binding, much faster than the pure python loader
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 
 class ConfigReader:
 
@@ -9,17 +15,29 @@ class ConfigReader:
 
         self._bucket_file_reader = BucketFileStreamReader(bucket_name="gcp-challenge-javen-caserta")
 
+        # parsed config and the (generation, md5_hash) of the blob it was parsed from
+        self._cached = None
+        self._cached_signature = None
+
 
     @property
     def config(self):
-        #TODO: cache the config
         return self._read_config()
 
     def _read_config(self):
 
-        with self._bucket_file_reader.read(filename="config.yml") as stream:
+        # only the blob metadata is fetched here; the content is downloaded and parsed again only if it has changed
+        signature = self._bucket_file_reader.signature(filename="config.yml")
+        if self._cached is not None and signature == self._cached_signature:
+            return self._cached
+
+        # read the generation the signature was taken from, so a concurrent update cannot pair its content with the
+        # previous signature
+        with self._bucket_file_reader.read(filename="config.yml", generation=signature[0]) as stream:
             try:
-                return yaml.load(stream)
+                self._cached = yaml.load(stream, Loader=SafeLoader)
+                self._cached_signature = signature
+                return self._cached
             except:
                 print(traceback.format_exc())
                 raise
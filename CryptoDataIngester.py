@@ -1,7 +1,12 @@
-import datetime, time, traceback, urllib.parse
+import asyncio, concurrent.futures, datetime, io, json, queue, threading, time, traceback
+from dataclasses import dataclass
+
+import aiohttp
 import pandas as pd
-from pandas.io.json import json_normalize
-from requests import get
+import pyarrow as pa
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from BucketFileWriter import BucketFileWriter
 from ConfigReader import ConfigReader
@@ -21,76 +26,56 @@ class CryptoDataIngester:
     API called has docs here: https://coinmarketcap.com/api/
     """
 
-
+    # retry policy for API requests, shared by the requests session and the aiohttp ticker pulls
+    RETRY_TOTAL = 3
+    RETRY_BACKOFF_FACTOR = 0.5
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    # columns of the currency table and their arrow backed types; 'id' becomes the index
+    SCHEMA = {
+        'id': pd.ArrowDtype(pa.int64()),
+        'name': pd.ArrowDtype(pa.string()),
+        'symbol': pd.ArrowDtype(pa.string()),
+        'website_slug': pd.ArrowDtype(pa.string()),
+        'rank': pd.ArrowDtype(pa.int64()),
+        'circulating_supply': pd.ArrowDtype(pa.float64()),
+        'total_supply': pd.ArrowDtype(pa.float64()),
+        'max_supply': pd.ArrowDtype(pa.float64()),
+        'last_updated': pd.ArrowDtype(pa.int64()),
+        'quotes.USD.price': pd.ArrowDtype(pa.float64()),
+        'quotes.USD.volume_24h': pd.ArrowDtype(pa.float64()),
+        'quotes.USD.market_cap': pd.ArrowDtype(pa.float64()),
+        'quotes.USD.percent_change_1h': pd.ArrowDtype(pa.float64()),
+        'quotes.USD.percent_change_24h': pd.ArrowDtype(pa.float64()),
+        'quotes.USD.percent_change_7d': pd.ArrowDtype(pa.float64()),
+    }
+
+
+    @dataclass(slots=True)
     class InitializedStruct:
+        listing_initialized: bool = False
+        tickers_initialized: bool = False
+        global_content_initialized: bool = False
 
-        @property
-        def first_ticker_added(self):
-            return self._first_ticker_added
-
-        @first_ticker_added.setter
-        def first_ticker_added(self,value):
-            if isinstance(value, bool):
-                self._first_ticker_added = value
-            else:
+        def __setattr__(self, name, value):
+            # type checking only runs in debug mode (i.e. not under python -O)
+            if __debug__ and not isinstance(value, bool):
                 raise CryptoIngesterError(
-                    'InitializedStruct.first_ticker_added must be set as a bool, not as a {}'.format(type(value)))
+                    'InitializedStruct.{0} must be set as a bool, not as a {1}'.format(name, type(value)))
+            object.__setattr__(self, name, value)
 
         @property
         def initialized(self):
             return self.listing_initialized and self.tickers_initialized and self.global_content_initialized
 
-        @property
-        def listing_initialized(self):
-            return self._listing_initialized
-
-        @listing_initialized.setter
-        def listing_initialized(self, value):
-            if isinstance(value, bool):
-                self._listing_initialized = value
-            else:
-                raise CryptoIngesterError(
-                    'InitializedStruct.listing_initialized must be set as a bool, not as a {}'.format(type(value)))
-
-        @property
-        def tickers_initialized(self):
-            return self._tickers_initialized
-
-        @tickers_initialized.setter
-        def tickers_initialized(self, value):
-            if isinstance(value, bool):
-                self._tickers_initialized = value
-            else:
-                raise CryptoIngesterError(
-                    'InitializedStruct.tickers_initialized must be set as a bool, not as a {}'.format(type(value)))
-
-        @property
-        def global_content_initialized(self):
-            return self._global_content_initialized
-
-        @global_content_initialized.setter
-        def global_content_initialized(self, value):
-            if isinstance(value, bool):
-                self._global_content_initialized = value
-            else:
-                raise CryptoIngesterError(
-                    'InitializedStruct.global_content_initialized must be set as a bool, not as a {}'.format(type(value)))
-
-        def __init__(self):
-            self.listing_initialized = False
-            self.tickers_initialized = False
-            self.global_content_initialized = False
-            self.first_ticker_added = False
-
     class PageTracker:
         def __init__(self, page_length, max_page):
             self._page_length = page_length
-            self._max_page = max_page
 
-            self._next_page = None
             self._completed_full_cycle = False
             self._last_page = None
-            self._comping_page = None
+
+            self.max_page = max_page
 
         @property
         def last_page(self):
@@ -103,34 +88,26 @@ class CryptoDataIngester:
         @max_page.setter
         def max_page(self,value):
             self._max_page = value
+            # start value of every page in a cycle, computed once rather than on every cycle
+            self._pages = tuple(range(1, value + 1, self._page_length)) if value else ()
 
         @property
         def completed_full_cycle(self):
             return self._completed_full_cycle
 
         @property
-        def next_page(self):
+        def pages(self):
+            return self._pages
 
-            if self._next_page is None:
-                page_to_return = 1
-                self._last_page = page_to_return
-                self._next_page = self._page_length + 1
-            else:
-                page_to_return = self._next_page
-                self._last_page = page_to_return
-                self._next_page = self._next_page + self._page_length
-                if self._next_page > self.max_page:
-                    self._next_page = 1
-                    self._completed_full_cycle = True
-                pass
-
-            return page_to_return
+        def complete_cycle(self):
+            if not self._pages:
+                raise CryptoIngesterError(
+                    'PageTracker has no pages to cycle through (max_page is {0})'.format(self.max_page))
 
-        @property
-        def coming_page(self):
-            return self._next_page
+            self._last_page = self._pages[-1]
+            self._completed_full_cycle = True
 
-    class CSV_Persistor:
+    class Parquet_Persistor:
 
         def __init__(self,bucket):
             self.bucket_writer = BucketFileWriter(bucket_name=bucket)
@@ -139,31 +116,106 @@ class CryptoDataIngester:
             if not isinstance(dataframe,pd.DataFrame):
                 raise ValueError('dataframe must be of type pandas.DataFrame')
 
-            import os
-            print(dataframe.columns)
-            dataframe.to_csv(blob_filename, index = False)
+            buffer = io.BytesIO()
+            # the id index is the currency key, so it is written out as a regular column
+            dataframe.reset_index().to_parquet(buffer, engine='pyarrow', compression='zstd', compression_level=3,
+                                               index = False)
+            buffer.seek(0)
 
-            self.bucket_writer.upload(blob_filename)
+            self.bucket_writer.upload_stream(blob_filename, buffer, content_type='application/vnd.apache.parquet')
 
-    class Logger: #TODO This is blocking and simple. Change to operate on thread and write to BigTable, Mongo, or other noSQL DB at a later time
+    class Logger: #TODO Change to write to BigTable, Mongo, or other noSQL DB at a later time
+        """
+        Messages are queued by log() and written by a background thread, which appends them to the log blobs in the
+        bucket at most once every flush_interval seconds (or sooner once max_buffer_size characters are pending), rather
+        than once per message. Only the new messages are uploaded on each flush. After a failed flush the next attempt
+        is backed off, up to max_flush_backoff seconds, instead of retrying on every new message.
+        """
 
         error_log = 'errors.log'
         api_errors = 'api_errors.log'
 
+        flush_interval = 30
+        max_flush_backoff = 600
+        max_buffer_size = 128 * 1024
+        # messages kept per log while flushes fail; the oldest are dropped beyond this
+        max_retained_size = 1024 * 1024
+
         def __init__(self,bucket):
             self.bucket_writer = BucketFileWriter(bucket_name=bucket)
 
+            self._log_files = {'error': self.error_log, 'api_error': self.api_errors}
+            self._buffers = {filename: io.StringIO() for filename in self._log_files.values()}
+            self._pending = 0
+
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
         def log(self,message,type_of_message):
-            if type_of_message=='error':
-                with open(self.error_log,'a') as fh:
-                    fh.write(message)
-                self.bucket_writer.upload(self.error_log)
-            elif type_of_message=='api_error':
-                with open(self.api_errors,'a') as fh:
-                    fh.write(message)
-                self.bucket_writer.upload(self.api_errors)
-            else:
-                pass
+            self._queue.put((message, type_of_message))
+
+        def close(self):
+            self._queue.put(None)
+            self._thread.join()
+
+        def _run(self):
+            next_flush = time.monotonic() + self.flush_interval
+            failures = 0
+
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0, next_flush - time.monotonic()))
+                except queue.Empty:
+                    item = ()
+
+                if item is None:
+                    self._flush()
+                    return
+
+                if item:
+                    message, type_of_message = item
+                    if type_of_message in self._log_files:
+                        self._buffers[self._log_files[type_of_message]].write(message)
+                        self._pending += len(message)
+
+                # a full buffer only forces an early flush while flushes are succeeding
+                if (self._pending >= self.max_buffer_size and not failures) or time.monotonic() >= next_flush:
+                    if self._flush():
+                        failures = 0
+                        delay = self.flush_interval
+                    else:
+                        failures += 1
+                        delay = min(self.flush_interval * 2 ** failures, self.max_flush_backoff)
+                    next_flush = time.monotonic() + delay
+
+        def _flush(self):
+            self._pending = 0
+            flushed = True
+
+            for filename, buffer in list(self._buffers.items()):
+                content = buffer.getvalue()
+                if not content:
+                    continue
+
+                # start over with a fresh buffer so one burst of messages does not keep its memory around
+                self._buffers[filename] = io.StringIO()
+
+                try:
+                    self.bucket_writer.append(filename, content)
+                except:
+                    print(traceback.format_exc())
+                    # keep the messages for the next flush, but only the newest ones so a lasting outage cannot grow
+                    # the buffer without bound
+                    if len(content) > self.max_retained_size:
+                        print('Dropping {0} characters of {1} after failed flushes.'.format(
+                            len(content) - self.max_retained_size, filename))
+                        content = content[-self.max_retained_size:]
+                    self._buffers[filename].write(content)
+                    self._pending += len(content)
+                    flushed = False
+
+            return flushed
 
     def __init__(self):
 
@@ -172,33 +224,50 @@ class CryptoDataIngester:
 
         self._listing_config = config['api']['listings']
         self._ticker_config = config['api']['ticker']
+        self._ticker_url_template = self._ticker_config['address'] + '?start={0}&sort=id&structure=array'
         self._global_config = config['api']['global']
         self._persist_config = config['persist']
 
         self.pull_frequency_minimum_interval = config['api']['pull_frequency_minimum_interval']
+        self._max_concurrent_pulls = config['api'].get('max_concurrent_pulls', 4)
+        self._request_timeout = config['api'].get('request_timeout', 10)
 
         self._error_timeout = config['api']['error_timeout']
         self._timeout = config['api']['timeout']
         self._refresh_timeout = self._ticker_config['refresh_period']
         self._timeout_start = None
-        self._in_timeout = False
 
-        self._currency_df = pd.DataFrame.empty
+        self._currency_df = self._typed(pd.DataFrame(columns=list(self.SCHEMA))).set_index('id')
 
         self._meta_data = None
 
-        self._last_pull = self.current_time
+        # internal timings use the monotonic clock; current_time is only used for the timestamps written to the logs
+        self._last_pull = time.monotonic()
 
-        self._last_listing_update = self.current_time
+        self._last_listing_update = time.monotonic()
+        self._last_global_update = time.monotonic()
         self._initilization_tracker = self.InitializedStruct()
 
         self.page_tracker = self.PageTracker(page_length=config['api']['ticker']['page_length'],
                                              max_page=None)
 
-        self._persistor = self.CSV_Persistor(bucket=self._persist_config['bucket'])
+        self._persistor = self.Parquet_Persistor(bucket=self._persist_config['bucket'])
+        # a single worker keeps the uploads in order while the next cycle is pulled
+        self._persist_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         self._logger = self.Logger(bucket=self._persist_config['bucket'])
 
+        # a single session keeps the connection to the API alive between pulls instead of a new TCP and TLS handshake
+        # on every request
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                                 max_retries=Retry(total=self.RETRY_TOTAL,
+                                                                   backoff_factor=self.RETRY_BACKOFF_FACTOR,
+                                                                   status_forcelist=self.RETRY_STATUSES)))
+
         self.running = False
+        self._stop_event = threading.Event()
+        # (event loop, task) of the ticker pull in progress, so stop() can cancel it from another thread
+        self._fetch = None
 
     @property
     def current_time(self):
@@ -206,13 +275,40 @@ class CryptoDataIngester:
 
     @property
     def pull_allowed(self):
-        condition_1 = (self.current_time - self._last_pull).total_seconds() > self.pull_frequency_minimum_interval
-        condition_2 = self._timeout_start is None or ((self.current_time - self._timeout_start).total_seconds() > self._refresh_timeout)
+        now = time.monotonic()
 
-        self._in_timeout = not condition_2
+        condition_1 = (now - self._last_pull) > self.pull_frequency_minimum_interval
+        condition_2 = self._timeout_start is None or (now - self._timeout_start) > self._refresh_timeout
 
         return condition_1 and condition_2
 
+    @property
+    def seconds_until_pull_allowed(self):
+        next_pull = self._last_pull + self.pull_frequency_minimum_interval
+        if self._timeout_start is not None:
+            next_pull = max(next_pull, self._timeout_start + self._refresh_timeout)
+
+        return max(0, next_pull - time.monotonic())
+
+    def stop(self):
+        """
+        Stops run_updater from another thread. Any sleep in progress is interrupted rather than waited out.
+        """
+
+        self.running = False
+        self._stop_event.set()
+
+        # a ticker pull in progress sleeps through its staggered request starts, so it is cancelled rather than
+        # waited out
+        fetch = self._fetch
+        if fetch is not None:
+            loop, task = fetch
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # the pull finished and its loop is already closed
+                pass
+
     def run_updater(self):
         """
         This is the engine. It will make sure everything is initialized (data) and that it keep up to date. Any handlable
@@ -220,6 +316,7 @@ class CryptoDataIngester:
         """
 
         self.running = True
+        self._stop_event.clear()
 
         while(self.running):
 
@@ -228,7 +325,9 @@ class CryptoDataIngester:
                     self._update_data()
                 else:
                     self._initialize_data()
-                time.sleep(self._timeout)
+                # nothing can be pulled before then, so sleep until the next pull is allowed instead of waking up every
+                # timeout seconds to find out
+                self._stop_event.wait(max(self._timeout, self.seconds_until_pull_allowed))
 
             except KeyboardInterrupt:
                 print('exiting software')
@@ -240,7 +339,7 @@ class CryptoDataIngester:
             except CryptoIngestResponseError as ex:
                 self._logger.log(message=str(ex),type_of_message='api_error')
                 print('Encountered API error. Sleeping for {0} seconds.'.format(self._error_timeout))
-                time.sleep(self._error_timeout)
+                self._stop_event.wait(self._error_timeout)
 
             except:
 
@@ -249,7 +348,23 @@ class CryptoDataIngester:
                 self._logger.log(message=msg,
                                  type_of_message='error')
                 print('Encountered error. Sleeping for {0} seconds.'.format(self._error_timeout))
-                time.sleep(self._error_timeout)
+                self._stop_event.wait(self._error_timeout)
+
+    def close(self):
+        """
+        Waits for pending persists and flushes the logs. Call once the ingester is no longer needed; run_updater can be
+        stopped and started again any number of times before that.
+        """
+
+        self._persist_executor.shutdown(wait=True)
+        self._logger.close()
+
+    def _log_persist_error(self, future):
+        ex = future.exception()
+        if ex is not None:
+            msg = json.dumps({'message':''.join(traceback.format_exception(ex)),'time':self.current_time.strftime('%s')})
+            self._logger.log(message=msg,
+                             type_of_message='error')
 
     def _initialize_data(self):
 
@@ -260,29 +375,30 @@ class CryptoDataIngester:
             if self._update_currency_list(override_update=True):
               self._initilization_tracker.listing_initialized = True
         elif not self._initilization_tracker.tickers_initialized:
-            self._update_next_ticker_set()
+            self._update_tickers()
             if self.page_tracker.completed_full_cycle:
                 self._initilization_tracker.tickers_initialized = True
 
     def _update_data(self):
         self._update_currency_list()
 
-        self._update_next_ticker_set()
+        self._update_tickers()
 
     def _update_global(self, override_update = False):
 
         try:
 
-            time = self.current_time
+            now = time.monotonic()
 
-            if ((time - self._last_listing_update).total_seconds() > self._global_config['pull_frequency'] or override_update) \
+            if ((now - self._last_global_update) > self._global_config['pull_frequency'] or override_update) \
                     and self.pull_allowed:
-                result = get(self._global_config['address']).json()
-                self._last_pull = time
+                result = self._http.get(self._global_config['address'], timeout=self._request_timeout).json()
+                self._last_pull = now
                 if result['data']:
                     self.page_tracker.max_page = result['data']['active_cryptocurrencies']
                 else:
                     raise CryptoIngestResponseError(json.dumps(result['metadata']))
+                self._last_global_update = now
                 return True
             else:
                 return False
@@ -291,61 +407,143 @@ class CryptoDataIngester:
             print(traceback.format_exc())
             raise
 
-    def _update_next_ticker_set(self):
-        try:
+    async def _fetch_all_pages(self, urls):
+        """
+        Pulls all the given pages concurrently. The start of each request is staggered by the minimum pull interval so
+        the API's robot rules are still obeyed, but the round trips overlap instead of running back to back. A page
+        that fails is returned as its exception so the other pages are not lost with it. stop() cancels the pull.
+        """
 
-            if (self.pull_allowed):
+        self._fetch = (asyncio.get_running_loop(), asyncio.current_task())
+        try:
+            # stop() may have been called just before the pull was registered
+            if self._stop_event.is_set():
+                raise asyncio.CancelledError()
+            return await self._fetch_pages(urls)
+        finally:
+            self._fetch = None
+
+    async def _fetch_pages(self, urls):
+
+        semaphore = asyncio.Semaphore(self._max_concurrent_pulls)
+
+        async def fetch(session, index, url):
+            await asyncio.sleep(index * self.pull_frequency_minimum_interval)
+            # same status retries and backoff as the requests session, but never sooner than the minimum pull interval
+            # so a retry (above all after a 429) still obeys the robot rules
+            for attempt in range(self.RETRY_TOTAL + 1):
+                async with semaphore:
+                    async with session.get(url) as response:
+                        if response.status not in self.RETRY_STATUSES:
+                            return await response.json(content_type=None)
+                        if attempt == self.RETRY_TOTAL:
+                            response.raise_for_status()
+                await asyncio.sleep(max(self.pull_frequency_minimum_interval,
+                                        self.RETRY_BACKOFF_FACTOR * 2 ** attempt))
+
+        connector = aiohttp.TCPConnector(limit=self._max_concurrent_pulls)
+        timeout = aiohttp.ClientTimeout(total=self._request_timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            return await asyncio.gather(*[fetch(session, index, url) for index, url in enumerate(urls)],
+                                        return_exceptions=True)
+
+    def _typed(self, dataframe):
+        return dataframe.astype({column: dtype for column, dtype in self.SCHEMA.items() if column in dataframe.columns})
+
+    @staticmethod
+    def _flatten_ticker(ticker):
+        """
+        Flattens the nested quotes of a ticker into 'quotes.<currency>.<field>' keys; the rest of the record is already
+        flat. The keys match what json_normalize produced, without its generic walk over every record.
+        """
 
-                time = self.current_time
+        record = dict(ticker)
+        for currency, quote in record.pop('quotes', {}).items():
+            for field, value in quote.items():
+                record['quotes.{0}.{1}'.format(currency, field)] = value
 
-                query = '?start={0}&sort=id&structure=array'.format(self.page_tracker.next_page)
-                get_url = urllib.parse.urljoin(self._ticker_config['address'],query)
+        return record
 
-                result = get(get_url).json()
-                self._last_pull = time
+    def _update_tickers(self):
+        try:
 
-                if result['data']:
-                    records = json_normalize(result['data'])
-                    response_df = pd.DataFrame.from_records(records,index='id')
-                else:
-                    raise CryptoIngestResponseError(json.dumps(result['metadata']))
+            if (self.pull_allowed):
 
-                if self._initilization_tracker.first_ticker_added:
-                    self._currency_df.update(response_df)
-                else:
-                    self._currency_df = pd.merge(left=self._currency_df, right=response_df, on=['name', 'symbol', 'website_slug'], how='left')
-                    self._initilization_tracker.first_ticker_added = True
+                if not self.page_tracker.pages:
+                    raise CryptoIngesterError(
+                        'No ticker pages to pull; the number of currencies is {0}.'.format(self.page_tracker.max_page))
+
+                urls = [self._ticker_url_template.format(page) for page in self.page_tracker.pages]
+
+                try:
+                    results = asyncio.run(self._fetch_all_pages(urls))
+                except asyncio.CancelledError:
+                    if self.running:
+                        raise
+                    # cancelled by stop()
+                    return
+                self._last_pull = time.monotonic()
+
+                # merge the pages that came back; the failed ones are logged and keep their previous values until the
+                # next cycle pulls them again
+                records = []
+                for url, result in zip(urls, results):
+                    if isinstance(result, BaseException):
+                        detail = ''.join(traceback.format_exception(result))
+                        msg = json.dumps({'message':'Failed to pull {0}: {1}'.format(url, detail),
+                                          'time':self.current_time.strftime('%s')})
+                        self._logger.log(message=msg,
+                                         type_of_message='error')
+                    elif isinstance(result, dict) and result.get('data'):
+                        records.extend(self._flatten_ticker(ticker) for ticker in result['data'])
+                    else:
+                        metadata = result.get('metadata') if isinstance(result, dict) else result
+                        msg = json.dumps({'message':'No ticker data from {0}'.format(url),'metadata':metadata,
+                                          'time':self.current_time.strftime('%s')}, default=str)
+                        self._logger.log(message=msg,type_of_message='api_error')
+
+                if not records:
+                    # every page failed and was logged above; fail the cycle so it is retried after the error timeout
+                    raise CryptoIngesterError('None of the {0} ticker pages could be pulled.'.format(len(urls)))
+
+                response_df = self._typed(pd.DataFrame(records)).set_index('id')
+
+                # one pass over the stacked frames: for each id the latest non-null value of every column wins, so the
+                # listing columns are kept and the ticker columns are refreshed
+                self._currency_df = pd.concat([self._currency_df, response_df]).groupby(level='id').last()
+
+                self.page_tracker.complete_cycle()
+
+                self._timeout_start = time.monotonic()
+                # the frame is replaced, never modified in place, so a shallow copy is a safe snapshot
+                future = self._persist_executor.submit(self._persistor.persist,
+                                                       blob_filename=self._persist_config['filename'],
+                                                       dataframe=self._currency_df.copy(deep=False))
+                future.add_done_callback(self._log_persist_error)
 
         except:
             print(traceback.format_exc())
             raise
 
-        finally:
-            if self.page_tracker.coming_page == 1 and not self._in_timeout:
-                self._timeout_start = self.current_time
-                self._persistor.persist(blob_filename=self._persist_config['filename'],
-                                        dataframe=self._currency_df)
-                self._in_timeout = True
-
     def _update_currency_list(self, override_update = False):
         try:
 
-            time = self.current_time
+            now = time.monotonic()
 
-            if ((time - self._last_listing_update).total_seconds() > self._listing_config['pull_frequency'] or override_update)\
+            if ((now - self._last_listing_update) > self._listing_config['pull_frequency'] or override_update)\
                     and self.pull_allowed:
 
-                result = get(self._listing_config['address']).json()
-                self._last_pull = time
+                result = self._http.get(self._listing_config['address'], timeout=self._request_timeout).json()
+                self._last_pull = now
                 if result['data']:
-                    response_df = pd.DataFrame.from_records( result['data'], index='id' )
+                    response_df = self._typed(pd.DataFrame(result['data'])).set_index('id')
                 else:
                     raise CryptoIngestResponseError(json.dumps(result['metadata']))
 
-                if self._currency_df == pd.DataFrame.empty:
-                    self._currency_df = response_df
-                else:
-                    self._currency_df = pd.merge(left=self._currency_df, right=result, on=['name', 'symbol', 'website_slug'], how='right')
+                # keep the ticker data already pulled, but only for the currencies that are still listed
+                self._currency_df = pd.concat([self._currency_df, response_df]).groupby(level='id').last()\
+                    .reindex(response_df.index)
+                self._last_listing_update = now
 
                 return True
             else:
@@ -359,6 +557,7 @@ class CryptoDataIngester:
 if __name__ == '__main__':
     di = CryptoDataIngester()
 
-    import json
-
-    di.run_updater()
\ No newline at end of file
+    try:
+        di.run_updater()
+    finally:
+        di.close()
\ No newline at end of file
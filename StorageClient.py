@@ -0,0 +1,40 @@
+import threading
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import storage
+from requests.adapters import HTTPAdapter
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+# size of the connection pool on the client transport, large enough for bursts of concurrent uploads
+_POOL_SIZE = 16
+
+
+def get_client():
+    """
+    Returns the storage.Client shared by all bucket readers and writers. Building a client performs credential
+    discovery and opens a fresh connection pool, so it is done once and the connections are reused afterwards.
+    """
+
+    global _CLIENT
+
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = _build_client()
+
+    return _CLIENT
+
+
+def _build_client():
+    # The transport is built here so its connection pool can be sized, and handed to the client through the _http
+    # constructor argument that google-cloud-storage accepts for a custom requests.Session (1.x and 2.x).
+    credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+
+    session = AuthorizedSession(credentials)
+    session.mount("https://", HTTPAdapter(pool_connections=_POOL_SIZE, pool_maxsize=_POOL_SIZE))
+
+    return storage.Client(project=project, credentials=credentials, _http=session)